@@ -1,6 +1,15 @@
+import time
 import cv2
 from ultralytics import YOLO
 
+# Frames per second actually sent through the model.
+# Webcams are throttled by wall-clock, recorded files by skipping N-1 grabs.
+LIVE_TARGET_FPS = 15
+FILE_ANALYTICS_FPS = 5
+
+# Model input size; frames are shrunk to this before upload to the GPU
+IMGSZ = 640
+
 def main():
     # Load the trained model - replace 'best.pt' with your actual path if it's different
     model_path = "best.pt"
@@ -16,26 +25,65 @@ def main():
         print(f"Error: Could not open video source {video_source}.")
         return
 
+    # Ask the camera for model-sized frames; files (or stubborn cameras) are resized below
+    if not isinstance(video_source, str):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, IMGSZ)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, IMGSZ)
+
+    # grab() only pulls the next packet; the costly decode happens in retrieve(),
+    # so frames we can't run inference on are never decoded
+    is_file = isinstance(video_source, str)
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    frame_stride = max(1, round(source_fps / FILE_ANALYTICS_FPS)) if is_file else 1
+    min_interval = 1.0 / LIVE_TARGET_FPS
+    grabbed = 0
+    last_inference = 0.0
+
     print(f"Starting real-time pothole detection using {model_path}...")
     print("Press 'q' on the keyboard to exit.")
 
     while True:
-        # Read a frame from the capture
-        ret, frame = cap.read()
+        if not cap.grab():
+            print("End of video stream or error reading frame.")
+            break
+        grabbed += 1
+
+        if is_file:
+            if grabbed % frame_stride:
+                continue
+        elif time.perf_counter() - last_inference < min_interval:
+            continue
+
+        # Decode only the frame we're about to run inference on
+        ret, frame = cap.retrieve()
         if not ret:
             print("End of video stream or error reading frame.")
             break
+        last_inference = time.perf_counter()
+
+        # Shrink so the long side matches IMGSZ (keeps aspect ratio for YOLO's letterbox)
+        h, w = frame.shape[:2]
+        if max(h, w) > IMGSZ:
+            scale = IMGSZ / max(h, w)
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_LINEAR)
 
         # Run YOLO inference on the frame
         # You can adjust conf (confidence threshold) as needed to reduce false positives
-        results = model(frame, conf=0.4)
+        results = model(frame, imgsz=IMGSZ, conf=0.4, verbose=False)
 
-        # Visualize the results on the frame
-        # results[0].plot() automatically draws bounding boxes and labels onto the image array
-        annotated_frame = results[0].plot()
+        # Draw boxes directly on the frame (cheaper than results[0].plot())
+        boxes = results[0].boxes
+        if len(boxes):
+            xyxy = boxes.xyxy.cpu().numpy().astype(int)
+            cls = boxes.cls.cpu().numpy().astype(int)
+            conf = boxes.conf.cpu().numpy()
+            names = results[0].names
+            for (x1, y1, x2, y2), c, p in zip(xyxy, cls, conf):
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(frame, f"{names[c]} {p:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
         # Display the frame
-        cv2.imshow("Real-Time Pothole Detection", annotated_frame)
+        cv2.imshow("Real-Time Pothole Detection", frame)
 
         # Press 'q' on the keyboard to exit the loop
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -1,9 +1,29 @@
 import os
-import shutil
+import io
+import logging
+import mmap
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import torch
 from ultralytics import YOLO
 from pathlib import Path
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+from contextlib import contextmanager
+from PIL import Image, ExifTags
+
+# Per-image debug output is off unless DEBUG=true
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG if os.getenv("DEBUG", "false").lower() == "true" else logging.WARNING)
+
+# Loaded models keyed by weights path, shared across calls
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
+
+# FP16 on CUDA only. Ultralytics fixes device and precision when the predictor is built
+# on the first call, so the warm-up in get_model must pass these too
+_DEVICE_KWARGS = {"half": True, "device": 0} if torch.cuda.is_available() else {}
 
 def get_decimal_from_dms(dms, ref):
     if not dms or not ref:
@@ -25,83 +45,174 @@ def get_decimal_from_dms(dms, ref):
             decimal = -decimal
         return decimal
     except Exception as e:
-        print(f"Error converting DMS to decimal: {e}")
+        logger.warning("Error converting DMS to decimal: %s", e)
         return None
 
-def get_gps_coordinates(image_path):
-    print(f"[DEBUG] Extracting GPS from: {image_path}")
+def get_decimal_batch(dms_arr, ref_arr):
+    """
+    Vectorized DMS -> decimal conversion.
+    dms_arr: (N, 3) array of degrees, minutes, seconds; ref_arr: (N,) of 'N'/'S'/'E'/'W'.
+    """
+    dms_arr = np.asarray(dms_arr, dtype=np.float64).reshape(-1, 3)
+    sign = np.where(np.isin(np.asarray(ref_arr), ('S', 'W')), -1.0, 1.0)
+    return sign * (dms_arr[:, 0] + dms_arr[:, 1] / 60.0 + dms_arr[:, 2] / 3600.0)
+
+@contextmanager
+def open_mmap(image_path):
+    """
+    Open an image backed by a read-only memory map of the file.
+    Only the pages Pillow actually touches are read from the page cache.
+    """
+    with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with Image.open(mm) as image:
+            yield image
+
+def read_gps_ifd(image_source):
+    """
+    Return the GPS IFD for a file path or raw image bytes.
+    Paths are memory-mapped, so only the header pages holding EXIF are faulted in.
+    """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        with Image.open(io.BytesIO(image_source)) as image:
+            return image.getexif().get_ifd(ExifTags.IFD.GPSInfo)
+    with open_mmap(image_source) as image:
+        return image.getexif().get_ifd(ExifTags.IFD.GPSInfo)
+
+def get_gps_coordinates(image_source):
+    logger.debug("Extracting GPS from: %s", image_source if isinstance(image_source, (str, Path)) else "<bytes>")
     try:
-        image = Image.open(image_path)
-        exif_data = image._getexif()
-        if not exif_data:
-            print("[DEBUG] No EXIF data found in image.")
-            return None, None
-        
-        gps_info = {}
-        for tag, value in exif_data.items():
-            decoded = TAGS.get(tag, tag)
-            if decoded == "GPSInfo":
-                for t in value:
-                    sub_decoded = GPSTAGS.get(t, t)
-                    gps_info[sub_decoded] = value[t]
+        gps_info = read_gps_ifd(image_source)
         
         if not gps_info:
-            print("[DEBUG] No GPS info found in EXIF.")
+            logger.debug("No GPS info found in EXIF.")
             return None, None
             
-        lat = get_decimal_from_dms(gps_info.get('GPSLatitude'), gps_info.get('GPSLatitudeRef'))
-        lon = get_decimal_from_dms(gps_info.get('GPSLongitude'), gps_info.get('GPSLongitudeRef'))
+        lat = get_decimal_from_dms(gps_info.get(ExifTags.GPS.GPSLatitude), gps_info.get(ExifTags.GPS.GPSLatitudeRef))
+        lon = get_decimal_from_dms(gps_info.get(ExifTags.GPS.GPSLongitude), gps_info.get(ExifTags.GPS.GPSLongitudeRef))
         
-        print(f"[DEBUG] Found GPS: Lat={lat}, Lon={lon}")
+        logger.debug("Found GPS: Lat=%s, Lon=%s", lat, lon)
         return lat, lon
     except Exception as e:
-        print(f"[DEBUG] Error extracting GPS: {e}")
+        logger.debug("Error extracting GPS: %s", e)
         return None, None
 
-def run_inference(image_path, model_path='best.pt'):
+def read_gps_dms(image_path):
+    """
+    Return (lat_dms, lat_ref, lon_dms, lon_ref) for an image, or None when GPS tags are incomplete.
+    """
+    try:
+        gps_info = read_gps_ifd(image_path)
+    except Exception:
+        return None
+    lat = gps_info.get(ExifTags.GPS.GPSLatitude)
+    lat_ref = gps_info.get(ExifTags.GPS.GPSLatitudeRef)
+    lon = gps_info.get(ExifTags.GPS.GPSLongitude)
+    lon_ref = gps_info.get(ExifTags.GPS.GPSLongitudeRef)
+    if not (lat and lat_ref and lon and lon_ref):
+        return None
+    return [float(v) for v in lat], lat_ref, [float(v) for v in lon], lon_ref
+
+def gps_dms_to_decimal(records):
+    """
+    Convert read_gps_dms records to (lat, lon) pairs in one NumPy pass.
+    None records map to (None, None).
+    """
+    coords = [(None, None)] * len(records)
+    found = [i for i, rec in enumerate(records) if rec is not None]
+    if found:
+        dms = [row for i in found for row in (records[i][0], records[i][2])]
+        refs = [ref for i in found for ref in (records[i][1], records[i][3])]
+        decimals = get_decimal_batch(dms, refs).reshape(-1, 2)
+        for i, (lat, lon) in zip(found, decimals.tolist()):
+            coords[i] = (lat, lon)
+    return coords
+
+def get_model(model_path='best.pt'):
+    """
+    Return a cached YOLO model for model_path, loading and warming it up once.
+    """
+    model = _MODEL_CACHE.get(model_path)
+    if model is not None:
+        return model
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(model_path)
+        if model is None:
+            model = YOLO(model_path)
+            with torch.inference_mode():
+                model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False, **_DEVICE_KWARGS)
+            _MODEL_CACHE[model_path] = model
+    return model
+
+def read_image_mmap(image_path):
+    """
+    Decode an image to a BGR array straight from a memory-mapped file.
+    """
+    with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        finally:
+            # Release the exported buffer so the map can close
+            del buf
+
+def run_inference(image_path, model_path='best.pt', augment=False, model=None):
     """
     Run YOLO inference on a single image and return results directly from the results object.
+    Test-time augmentation runs the model ~3x per image, so it is opt-in.
+    Pass an already-loaded model to share it with the caller instead of loading model_path.
     """
-    model = YOLO(model_path)
+    if model is None:
+        model = get_model(model_path)
+    image = read_image_mmap(image_path)
+    if image is None:
+        raise ValueError(f"Could not decode image: {image_path}")
     
     # Run prediction
-    # We don't need save_txt=True anymore since we're using the results object directly
-    results = model.predict(
-        source=str(image_path),
-        save=False,
-        conf=0.25,
-        augment=True
-    )
+    # We don't need save_txt=True anymore since we're using the results object directly.
+    # conf/max_det are always passed: a shared model keeps the previous caller's settings otherwise
+    with torch.inference_mode():
+        results = model.predict(
+            source=image,
+            save=False,
+            conf=0.25,
+            max_det=300,
+            augment=augment,
+            verbose=False,
+            **_DEVICE_KWARGS
+        )
     
     predictions = []
     for r in results:
         boxes = r.boxes
-        for i in range(len(boxes)):
-            # xywhn is normalized [x_center, y_center, width, height]
-            xywhn = boxes.xywhn[i].tolist()
+        # Pull each tensor to host once instead of syncing per detection
+        # xywhn is normalized [x_center, y_center, width, height]
+        xywhn = boxes.xywhn.cpu().numpy().tolist()
+        cls = boxes.cls.cpu().numpy().astype(int).tolist()
+        conf = boxes.conf.cpu().numpy().tolist()
+        for i in range(len(cls)):
             predictions.append({
-                "class": int(boxes.cls[i]),
-                "className": r.names[int(boxes.cls[i])],
-                "lat": xywhn[0],
-                "lon": xywhn[1],
-                "width": xywhn[2],
-                "height": xywhn[3],
-                "confidence": float(boxes.conf[i])
+                "class": cls[i],
+                "className": r.names[cls[i]],
+                "lat": xywhn[i][0],
+                "lon": xywhn[i][1],
+                "width": xywhn[i][2],
+                "height": xywhn[i][3],
+                "confidence": conf[i]
             })
     
     return predictions
 
-def get_pothole_data(image_path, model_path='best.pt'):
+def get_pothole_data(image_path, model_path='best.pt', augment=False, model=None):
     """
     Consolidated function to extract GPS coordinates AND run YOLO inference.
     """
-    print(f"[DEBUG] get_pothole_data called for: {image_path} with model: {model_path}")
+    logger.debug("get_pothole_data called for: %s with model: %s", image_path, model_path)
     # 1. Extract GPS
     lat, lon = get_gps_coordinates(image_path)
     
     # 2. Run Inference
-    predictions = run_inference(image_path, model_path=model_path)
-    print(f"[DEBUG] Detections found: {len(predictions)}")
+    predictions = run_inference(image_path, model_path=model_path, augment=augment, model=model)
+    logger.debug("Detections found: %d", len(predictions))
     
     return {
         "lat": lat,
@@ -127,24 +238,31 @@ if __name__ == "__main__":
         conf=0.25,
         augment=True,
         name=output_name,
-        stream=True
+        stream=True,
+        batch=16
     )
 
-    for r in results:
-        pass
-
     yolo_output_dir = os.path.join('runs', 'detect', output_name, 'labels')
     final_folder = 'predictions'
 
-    if os.path.exists(final_folder):
-        shutil.rmtree(final_folder)
-    os.makedirs(final_folder)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        # EXIF reads run on the pool while the GPU works on the next batch
+        image_paths, gps_futures = [], []
+        for r in results:
+            image_paths.append(r.path)
+            gps_futures.append(pool.submit(read_gps_dms, r.path))
 
-    if os.path.exists(yolo_output_dir):
-        for filename in os.listdir(yolo_output_dir):
-            if filename.endswith(".txt"):
-                shutil.copy(os.path.join(yolo_output_dir, filename), os.path.join(final_folder, filename))
-    
-    shutil.make_archive('submission', 'zip', root_dir='.', base_dir=final_folder)
-    print(f"Successfully prepared submission.zip")
+        # Convert all GPS tags in one vectorized pass once inference is done
+        gps_coords = gps_dms_to_decimal([f.result() for f in gps_futures])
+        print(f"GPS found for {sum(lat is not None for lat, _ in gps_coords)}/{len(image_paths)} images")
 
+    # Stream labels straight into the archive under predictions/ — no staging copy.
+    # Label files are tiny, so the fastest deflate level is enough.
+    with zipfile.ZipFile('submission.zip', 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        if os.path.exists(yolo_output_dir):
+            # DirEntry caches d_type, so is_file() needs no extra stat call
+            with os.scandir(yolo_output_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".txt") and entry.is_file():
+                        z.write(entry.path, arcname=f"{final_folder}/{entry.name}")
+    print(f"Successfully prepared submission.zip")
@@ -4,13 +4,18 @@ FastAPI Backend with Authentication, WebSockets, Stripe, and Admin Dashboard
 """
 
 import os
+import re
+import hashlib
+import functools
 import time
 import json
 import asyncio
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Set
-from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, Set, Tuple
+from contextlib import asynccontextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
@@ -18,18 +23,33 @@ try:
 except Exception:
     cv2 = None
 import numpy as np
+try:
+    import orjson
+except Exception:
+    orjson = None
+try:
+    import torch
+    # Input size is fixed at 640, so cuDNN's autotuner only pays its search cost once
+    torch.backends.cudnn.benchmark = True
+    torch.set_float32_matmul_precision("high")
+except Exception:
+    torch = None
+try:
+    from prometheus_client import Histogram, generate_latest, CONTENT_TYPE_LATEST
+except Exception:
+    Histogram = None
 from fastapi import (
     FastAPI, File, Form, UploadFile, HTTPException, Request, 
     Depends, status, WebSocket, WebSocketDisconnect, Query
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response, ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import create_engine, event, func, Column, Integer, String, Float, DateTime, Boolean, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 try:
@@ -76,18 +96,27 @@ class Settings:
     # Server
     PORT: int = int(os.getenv("PORT", 8000))
     HOST: str = os.getenv("HOST", "0.0.0.0")
+    # Each worker loads its own model and keeps its own video/metrics state
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./roadvision.db")
     
     # Model
     MODEL_PATH: str = os.getenv("MODEL_PATH", "best.pt")
+    USE_TRT: bool = os.getenv("USE_TRT", "false").lower() == "true"
+    USE_OPENVINO: bool = os.getenv("USE_OPENVINO", "false").lower() == "true"  # CPU-only hosts
+    
+    # Batched inference
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", "16"))
+    BATCH_MAX_WAIT_MS: float = float(os.getenv("BATCH_MAX_WAIT_MS", "15"))
     DEMO_MODE: bool = os.getenv("DEMO_MODE", "true").lower() == "true"
     
     # Stripe
@@ -108,6 +137,16 @@ settings = Settings()
 
 Base = declarative_base()
 engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL + NORMAL sync: commits no longer fsync the whole DB on every scan insert."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class User(Base):
@@ -135,12 +174,12 @@ class Scan(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer)
     severity_score = Column(Float)
-    severity_level = Column(String)
+    severity_level = Column(String, index=True)
     crack_count = Column(Integer)
     avg_confidence = Column(Float)
     inference_time_ms = Column(Float)
     image_path = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 class ModelVersion(Base):
     """Model versioning for training pipeline."""
@@ -157,12 +196,15 @@ class ModelVersion(Base):
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+# create_all skips indexes on tables that already exist, so add new scan indexes explicitly
+for _index in Scan.__table__.indexes:
+    _index.create(bind=engine, checkfirst=True)
 
 # =============================================================================
 # AUTHENTICATION
 # =============================================================================
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -260,27 +302,92 @@ class SystemMetrics:
     
     async def broadcast(self, message: dict):
         """Broadcast message to all connected WebSockets."""
-        disconnected = set()
-        for ws in self.active_websockets:
-            try:
-                await ws.send_json(message)
-            except:
-                disconnected.add(ws)
+        if not self.active_websockets:
+            return
+        
+        # Serialize once for all clients and send concurrently so a slow client
+        # doesn't hold up the rest
+        payload = orjson.dumps(message).decode() if orjson is not None else json.dumps(message)
+        clients = list(self.active_websockets)
+        results = await asyncio.gather(*(ws.send_text(payload) for ws in clients), return_exceptions=True)
         
         # Remove disconnected clients
-        self.active_websockets -= disconnected
+        self.active_websockets -= {ws for ws, result in zip(clients, results) if isinstance(result, Exception)}
 
 # Global instances
 metrics = SystemMetrics()
+
+# Prometheus histograms (each also exports a _count series, so QPS comes for free)
+if Histogram is not None:
+    REQ_LATENCY = Histogram(
+        "http_request_seconds", "HTTP request latency in seconds", ["route", "method", "code"],
+        buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+    )
+    INFER_LATENCY = Histogram(
+        "yolo_inference_ms", "YOLO /predict inference time in milliseconds",
+        buckets=(5, 10, 25, 50, 100, 250, 500, 1000)
+    )
+else:
+    REQ_LATENCY = INFER_LATENCY = None
 model = None
 video_processor = None
 _upload_dir = os.path.join(tempfile.gettempdir(), "roadvision_uploads")
 _snapshots_dir = os.path.join(Path(__file__).resolve().parent, "snapshots")
 
+# Blocking CPU work (decode, resize, EXIF, file writes) runs here instead of on the event loop
+cpu_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# FP16 on CUDA halves memory bandwidth and enables tensor-core kernels
+_CUDA_AVAILABLE = torch is not None and torch.cuda.is_available()
+_DEVICE_KWARGS: Dict[str, Any] = {"half": True, "device": 0} if _CUDA_AVAILABLE else {}
+
 # =============================================================================
 # MODEL MANAGEMENT
 # =============================================================================
 
+def _engine_cache_path(weights_path: str) -> Path:
+    """Engines only run on the GPU/TensorRT they were built for, so key the cache on both."""
+    import tensorrt as trt
+    gpu_name = re.sub(r"[^A-Za-z0-9]+", "-", torch.cuda.get_device_name(0)).strip("-")
+    backend_dir = Path(__file__).resolve().parent
+    return backend_dir / f"{Path(weights_path).stem}.{gpu_name}.{trt.__version__}.engine"
+
+
+def export_tensorrt_engine(weights_path: str) -> str:
+    """Export weights to a TensorRT FP16 engine once per GPU and return the engine path."""
+    try:
+        engine_path = _engine_cache_path(weights_path)
+        if engine_path.exists():
+            logger.info(f"Reusing cached TensorRT engine {engine_path.name}")
+            return str(engine_path)
+        
+        logger.info(f"Building TensorRT engine {engine_path.name} from {weights_path} (one-time)")
+        # Max dynamic batch matches the /predict micro-batcher
+        exported = YOLO(weights_path).export(
+            format="engine", half=True, imgsz=640, dynamic=True, batch=settings.BATCH_MAX_SIZE, workspace=4
+        )
+        shutil.move(str(exported), engine_path)
+        return str(engine_path)
+    except Exception as e:
+        logger.warning(f"TensorRT export failed, falling back to PyTorch weights: {e}")
+        return weights_path
+
+
+def export_openvino_model(weights_path: str) -> str:
+    """Export weights to an FP16 OpenVINO model once and return its directory."""
+    model_dir = Path(weights_path).with_name(f"{Path(weights_path).stem}_openvino_model")
+    if model_dir.exists():
+        logger.info(f"Reusing cached OpenVINO model {model_dir.name}")
+        return str(model_dir)
+    
+    try:
+        logger.info(f"Exporting OpenVINO model from {weights_path} (one-time)")
+        return str(YOLO(weights_path).export(format="openvino", half=True, imgsz=640, dynamic=True))
+    except Exception as e:
+        logger.warning(f"OpenVINO export failed, falling back to PyTorch weights: {e}")
+        return weights_path
+
+
 def load_yolo_model(model_path: str = None):
     """Load real YOLOv8 model for road damage detection."""
     global model, metrics
@@ -306,9 +413,21 @@ def load_yolo_model(model_path: str = None):
         raise ImportError("ultralytics package is required but not installed")
     
     try:
+        if settings.USE_TRT and _CUDA_AVAILABLE:
+            resolved_path = export_tensorrt_engine(resolved_path)
+        elif settings.USE_OPENVINO or settings.USE_TRT:
+            # No GPU for TensorRT — OpenVINO is the fast path on CPU
+            resolved_path = export_openvino_model(resolved_path)
         logger.info(f"Loading YOLOv8 model from {resolved_path}")
         model = YOLO(resolved_path)
+        if _CUDA_AVAILABLE and resolved_path.endswith(".pt"):
+            model.fuse()
+            model.model.half()
         import gc; gc.collect()          # free loader temporaries
+        # Warm-up pass materializes the execution context before the first request
+        _dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+        with _inference_context():
+            model(_dummy, imgsz=640, verbose=False, **_DEVICE_KWARGS)
         metrics.model_loaded = True
         metrics.model_load_time = time.time()
         logger.info(f"✅ Model loaded successfully — classes: {model.names}")
@@ -325,10 +444,160 @@ def ensure_model_loaded():
         return model
     load_yolo_model()
     if VIDEO_PROCESSOR_AVAILABLE and model is not None:
-        video_processor = VideoProcessor(model=model)
+        video_processor = VideoProcessor(model=model, model_lock=_model_lock)
         logger.info("✅ VideoProcessor initialized (shared model)")
     return model
 
+# =============================================================================
+# BATCHED INFERENCE
+# =============================================================================
+
+def _inference_context():
+    """Disable autograd bookkeeping for inference when torch is available."""
+    return torch.inference_mode() if torch is not None else nullcontext()
+
+
+# Ultralytics writes call settings (conf, max_det, ...) onto the shared predictor before taking
+# its own lock, so /predict, /analyze and the video processor must not call the model concurrently
+_model_lock = threading.Lock()
+
+
+def _predict_batch(images: List[np.ndarray]):
+    """Run one batched forward pass (executed off the event loop)."""
+    with _model_lock, _inference_context():
+        return model.predict(images, imgsz=640, conf=0.35, max_det=50, verbose=False, **_DEVICE_KWARGS)
+
+
+class InferenceBatcher:
+    """Coalesces concurrent single-image requests into one batched model call."""
+    def __init__(self, max_batch: int, max_wait_ms: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Any] = []  # items the worker has taken off the queue
+    
+    def start(self):
+        """Start the background worker on the running event loop."""
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._worker())
+    
+    async def stop(self):
+        """Cancel the background worker and fail any requests still waiting in the queue."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = list(self._batch)
+        if self.queue is not None:
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("batcher stopped"))
+    
+    async def infer(self, image: np.ndarray):
+        """Queue an image and wait for its Results object."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, future))
+        return await future
+    
+    async def _worker(self):
+        """Drain up to max_batch items (or until max_wait elapses) per model call."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                # Take whatever is already queued without paying for a wait_for
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            images = [image for image, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, _predict_batch, images)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+inference_batcher = InferenceBatcher(settings.BATCH_MAX_SIZE, settings.BATCH_MAX_WAIT_MS)
+
+# =============================================================================
+# SCAN HISTORY WRITER
+# =============================================================================
+
+def _save_scans(batch: List[Dict[str, Any]]):
+    """Persist buffered scan records in one bulk insert (runs off the event loop)."""
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects([Scan(**fields) for fields in batch])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to save {len(batch)} scans: {e}")
+    finally:
+        db.close()
+
+
+class ScanWriter:
+    """Buffers scan records from /predict and flushes them once per interval."""
+    def __init__(self, flush_interval: float = 0.5):
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the periodic flush task on the running event loop."""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+    
+    async def stop(self):
+        """Stop the flush task after writing whatever is still buffered."""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+    
+    def submit(self, scan_fields: Dict[str, Any]):
+        """Queue a scan record for the next flush."""
+        self._buffer.append(scan_fields)
+    
+    async def _flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await asyncio.get_running_loop().run_in_executor(None, _save_scans, batch)
+    
+    async def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+
+scan_writer = ScanWriter()
+
 # =============================================================================
 # LIFESPAN MANAGEMENT
 # =============================================================================
@@ -347,8 +616,14 @@ async def lifespan(app: FastAPI):
     # can detect the bound port before the 512 MB memory limit is hit.
     logger.info("✅ Server ready (model will lazy-load on first request)")
     
+    inference_batcher.start()
+    scan_writer.start()
+    
     yield
     
+    await inference_batcher.stop()
+    await scan_writer.stop()
+    cpu_pool.shutdown(wait=False)
     logger.info("🛑 Server shutting down...")
 
 # =============================================================================
@@ -400,10 +675,16 @@ CLASS_NAMES = {
 @app.middleware("http")
 async def timing_middleware(request: Request, call_next):
     """Track request timing."""
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    duration = time.time() - start_time
-    response.headers["X-Request-Duration"] = str(duration)
+    duration = time.perf_counter() - start_time
+    response.headers["X-Request-Duration"] = f"{duration:.6f}"
+    if REQ_LATENCY is not None:
+        # Label by route template, not raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        REQ_LATENCY.labels(
+            getattr(route, "path", "unmatched"), request.method, str(response.status_code)
+        ).observe(duration)
     return response
 
 # =============================================================================
@@ -449,10 +730,13 @@ async def register(
     if db.query(User).filter(User.email == email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    # Hash off the event loop — bcrypt is deliberately slow
+    hashed_password = await asyncio.get_running_loop().run_in_executor(None, get_password_hash, password)
+    
     # Create user
     user = User(
         email=email,
-        hashed_password=get_password_hash(password),
+        hashed_password=hashed_password,
         full_name=full_name,
         scans_limit=10  # Free tier
     )
@@ -468,7 +752,10 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     """Login and get access token."""
     user = db.query(User).filter(User.email == form_data.username).first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    password_ok = user is not None and await asyncio.get_running_loop().run_in_executor(
+        None, verify_password, form_data.password, user.hashed_password
+    )
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -510,40 +797,51 @@ async def get_me(current_user: User = Depends(get_current_active_user)):
 # MAIN PAGES
 # =============================================================================
 
+@functools.lru_cache(maxsize=None)
+def _render_page(name: str, **context) -> Tuple[bytes, str]:
+    """Render a template once per context; pages don't depend on the request."""
+    body = templates.get_template(name).render(**context).encode("utf-8")
+    return body, f'"{hashlib.md5(body).hexdigest()}"'
+
+def _cached_response(request: Request, body: bytes, etag: str, media_type: str) -> Response:
+    """Serve a precomputed body with ETag/Cache-Control, answering 304 on a match."""
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Main application page."""
-    return templates.TemplateResponse("index.html", {"request": request, "demo_mode": settings.DEMO_MODE})
+    return _cached_response(request, *_render_page("index.html", demo_mode=settings.DEMO_MODE), "text/html")
 
 @app.get("/demo")
 async def demo(request: Request, mode: str = None):
     """Demo mode with optional investor mode."""
-    return templates.TemplateResponse("demo.html", {
-        "request": request,
-        "investor_mode": mode == "investor"
-    })
+    return _cached_response(request, *_render_page("demo.html", investor_mode=mode == "investor"), "text/html")
 
 @app.get("/admin")
 async def admin(request: Request):
     """Admin dashboard."""
-    return templates.TemplateResponse("admin.html", {"request": request})
+    return _cached_response(request, *_render_page("admin.html"), "text/html")
 
 @app.get("/training")
 async def training(request: Request):
     """AI training pipeline UI."""
-    return templates.TemplateResponse("training.html", {"request": request})
+    return _cached_response(request, *_render_page("training.html"), "text/html")
 
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
 
+# Public config is constant for the life of the process
+_CONFIG_BODY = json.dumps({"demo_mode": settings.DEMO_MODE, "version": "2.0.0"}).encode("utf-8")
+_CONFIG_ETAG = f'"{hashlib.md5(_CONFIG_BODY).hexdigest()}"'
+
 @app.get("/api/config")
-async def get_config():
+async def get_config(request: Request):
     """Return public application config."""
-    return {
-        "demo_mode": settings.DEMO_MODE,
-        "version": "2.0.0"
-    }
+    return _cached_response(request, _CONFIG_BODY, _CONFIG_ETAG, "application/json")
 
 @app.get("/health")
 async def health_check():
@@ -560,6 +858,59 @@ async def get_metrics():
     """Get system metrics."""
     return metrics.to_dict()
 
+@app.get("/metrics/prometheus")
+async def get_prometheus_metrics():
+    """Prometheus scrape endpoint (the JSON /metrics above is kept for the dashboard)."""
+    if REQ_LATENCY is None:
+        raise HTTPException(status_code=503, detail="prometheus_client not installed")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def letterbox(img: np.ndarray, new: int = 640) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """Resize keeping aspect ratio and pad to new x new; returns (image, scale, (pad_x, pad_y))."""
+    height, width = img.shape[:2]
+    scale = new / max(height, width)
+    new_w, new_h = round(width * scale), round(height * scale)
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    pad_x, pad_y = (new - new_w) // 2, (new - new_h) // 2
+    # Gray (114) padding matches what YOLO saw in training, so the border can't produce detections
+    img = cv2.copyMakeBorder(img, pad_y, new - new_h - pad_y, pad_x, new - new_w - pad_x,
+                             cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return np.ascontiguousarray(img), scale, (pad_x, pad_y)
+
+def _decode_upload(contents: bytes, size: int = 640):
+    """Decode upload bytes and letterbox to size x size (runs on cpu_pool).
+    
+    Returns (image, scale, (pad_x, pad_y), (height, width)) or None if undecodable.
+    """
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return (*letterbox(image, size), image.shape[:2])
+
+def _to_numpy(values) -> np.ndarray:
+    """Copy a whole tensor to host in one go (plain arrays pass through)."""
+    return values.cpu().numpy() if hasattr(values, "cpu") else np.asarray(values)
+
+def _write_bytes(path: str, data: bytes):
+    """Write an upload to disk (runs on cpu_pool)."""
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _copy_upload(src, path: str):
+    """Stream an upload's file object to disk in chunks (runs on cpu_pool)."""
+    with open(path, "wb") as f:
+        shutil.copyfileobj(src, f, 1 << 20)
+
+async def _read_upload(file: UploadFile, max_size: int) -> bytearray:
+    """Read an upload in 64KB chunks, rejecting it as soon as it exceeds max_size."""
+    buf = bytearray()
+    while chunk := await file.read(1 << 16):
+        buf += chunk
+        if len(buf) > max_size:
+            raise HTTPException(status_code=413, detail="File too large")
+    return buf
+
 async def _get_optional_user(
     db: Session = Depends(get_db),
 ):
@@ -570,7 +921,9 @@ async def _get_optional_user(
     # the real dependency when not in demo mode.
     return None
 
-@app.post("/predict")
+ALLOWED_IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+@app.post("/predict", response_class=ORJSONResponse)
 async def predict(
     file: UploadFile = File(...),
     browser_lat: Optional[float] = Form(None),
@@ -585,60 +938,39 @@ async def predict(
     if current_user and current_user.scans_used >= current_user.scans_limit:
         raise HTTPException(status_code=403, detail="Scan limit exceeded. Upgrade your plan.")
     
+    # Validate file type before loading the model or reading any upload bytes
+    if not (file.filename or "").lower().endswith(ALLOWED_IMAGE_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    
     if model is None:
         try:
             ensure_model_loaded()
         except Exception as exc:
             raise HTTPException(status_code=503, detail=f"Model failed to load: {exc}")
     
-    # Validate file
-    allowed_extensions = {'.jpg', '.jpeg', '.png'}
-    ext = os.path.splitext(file.filename.lower())[1]
-    if ext not in allowed_extensions:
-        raise HTTPException(status_code=400, detail="Invalid file type")
-    
-    temp_path = None
-    
     try:
-        # Save temp file (needed for EXIF GPS extraction)
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, f"{int(time.time())}_{file.filename}")
-        contents = await file.read()
+        contents = await _read_upload(file, settings.MAX_FILE_SIZE)
         
-        if len(contents) > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="File too large")
-        
-        with open(temp_path, "wb") as f:
-            f.write(contents)
-        
-        # Decode image directly from memory buffer (skip disk re-read)
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if image is None:
+        # Decode + resize on the CPU pool so the event loop keeps serving other requests
+        loop = asyncio.get_running_loop()
+        decoded = await loop.run_in_executor(cpu_pool, _decode_upload, contents)
+        if decoded is None:
             raise HTTPException(status_code=400, detail="Could not read image")
         
-        height, width = image.shape[:2]
+        image, scale, (pad_x, pad_y), (height, width) = decoded
         
-        # Resize large images to reduce memory (YOLO uses imgsz=640 internally)
-        MAX_DIM = 1920
-        if max(height, width) > MAX_DIM:
-            scale = MAX_DIM / max(height, width)
-            image = cv2.resize(image, (int(width * scale), int(height * scale)))
-            logger.info(f"Resized {width}x{height} → {image.shape[1]}x{image.shape[0]}")
-            height, width = image.shape[:2]  # update to resized dims
-        
-        # total_image_area must match the coordinate space YOLO returns boxes in
+        # Boxes are mapped back to original-image coordinates below, so areas use its size
         total_image_area = height * width
         
-        # Run inference — imgsz=640 for speed, max_det=50 to cap detections
+        # Run inference through the micro-batcher — imgsz=640, max_det=50
         inference_start = time.time()
-        results = model(image, verbose=False, conf=0.35, imgsz=640, max_det=50)
+        results = [await inference_batcher.infer(image)]
         
-        # Extract GPS coordinates from image EXIF (if available)
+        # Extract GPS coordinates from image EXIF (if available) — parsed from the upload bytes
         gps_lat, gps_lon = None, None
         if get_gps_coordinates:
             try:
-                gps_lat, gps_lon = get_gps_coordinates(temp_path)
+                gps_lat, gps_lon = await loop.run_in_executor(cpu_pool, get_gps_coordinates, contents)
             except Exception:
                 pass
         
@@ -646,77 +978,74 @@ async def predict(
         if gps_lat is None and gps_lon is None and browser_lat is not None and browser_lon is not None:
             gps_lat = browser_lat
             gps_lon = browser_lon
-            logger.info(f"Using browser GPS: ({gps_lat}, {gps_lon})")
+            logger.debug("Using browser GPS: (%s, %s)", gps_lat, gps_lon)
         
         # Process detections
         detections = []
-        total_crack_area = 0
+        box_areas, box_confs = [], []
         
-        logger.info(f"Inference complete — {sum(len(r.boxes) for r in results)} raw boxes")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Inference complete — %d raw boxes", sum(len(r.boxes) for r in results))
         
         for result in results:
-            for box in result.boxes:
-                xyxy = box.xyxy[0]
-                conf = box.conf[0]
-                cls_id = box.cls[0]
-                # Support both PyTorch tensors (.cpu().numpy()) and plain numpy arrays
-                if hasattr(xyxy, 'cpu'):
-                    xyxy = xyxy.cpu().numpy()
-                if hasattr(conf, 'cpu'):
-                    conf = float(conf.cpu().numpy())
-                else:
-                    conf = float(conf)
-                if hasattr(cls_id, 'cpu'):
-                    cls_id = int(cls_id.cpu().numpy())
-                else:
-                    cls_id = int(cls_id)
-                x1, y1, x2, y2 = xyxy
-                confidence = conf
-                
-                box_area = (x2 - x1) * (y2 - y1)
-                total_crack_area += box_area
-                
+            # One device→host copy per tensor instead of a sync per box
+            xyxy = _to_numpy(result.boxes.xyxy).reshape(-1, 4)
+            # Undo the letterbox: remove padding, rescale, clip to the original image
+            xyxy = (xyxy - (pad_x, pad_y, pad_x, pad_y)) / scale
+            np.clip(xyxy, 0, (width, height, width, height), out=xyxy)
+            confs = _to_numpy(result.boxes.conf).reshape(-1)
+            cls_ids = _to_numpy(result.boxes.cls).reshape(-1).astype(int)
+            
+            box_areas.append((xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1]))
+            box_confs.append(confs)
+            
+            for (x1, y1, x2, y2), confidence, cls_id in zip(xyxy.tolist(), confs.tolist(), cls_ids.tolist()):
                 # Class name from model or fallback map
                 class_name = result.names.get(cls_id, CLASS_NAMES.get(cls_id, f"class_{cls_id}"))
                 
                 color = "#00FF00" if confidence >= 0.8 else "#FFFF00" if confidence >= 0.5 else "#FF0000"
                 
                 detections.append({
-                    "x1": float(x1), "y1": float(y1),
-                    "x2": float(x2), "y2": float(y2),
-                    "confidence": round(confidence, 4),
+                    "x1": x1, "y1": y1,
+                    "x2": x2, "y2": y2,
+                    "confidence": confidence,
                     "class_id": cls_id,
                     "class_name": class_name,
                     "color": color,
                     "depth": confidence  # For 3D visualization
                 })
         
+        # Severity inputs as single NumPy reductions
+        areas = np.concatenate(box_areas) if box_areas else np.empty(0)
+        confs = np.concatenate(box_confs) if box_confs else np.empty(0)
+        total_crack_area = float(areas.sum())
+        avg_confidence = float(confs.mean()) if confs.size else 0.0
+        
         # Calculate severity
         severity_score = min((total_crack_area / total_image_area) * 100, 100) if total_image_area > 0 else 0
         severity_level = "Low" if severity_score < 30 else "Moderate" if severity_score < 60 else "Severe"
         
         crack_count = len(detections)
-        avg_confidence = sum(d["confidence"] for d in detections) / crack_count if crack_count > 0 else 0
         
         inference_time = (time.time() - inference_start) * 1000
         metrics.update_inference_time(inference_time)
+        if INFER_LATENCY is not None:
+            INFER_LATENCY.observe(inference_time)
         
         # Update user scan count (skip in demo mode)
         if current_user:
             current_user.scans_used += 1
             db.commit()
         
-        # Save scan to history
-        scan = Scan(
-            user_id=current_user.id if current_user else 0,
-            severity_score=severity_score,
-            severity_level=severity_level,
-            crack_count=crack_count,
-            avg_confidence=avg_confidence,
-            inference_time_ms=inference_time
-        )
-        db.add(scan)
-        db.commit()
+        # Buffer the scan for the next bulk insert so the response doesn't wait on a commit
+        scan_writer.submit({
+            "user_id": current_user.id if current_user else 0,
+            "severity_score": severity_score,
+            "severity_level": severity_level,
+            "crack_count": crack_count,
+            "avg_confidence": avg_confidence,
+            "inference_time_ms": inference_time
+        })
         
         # Update latest inference for WebSocket
         metrics.latest_inference = {
@@ -733,30 +1062,25 @@ async def predict(
             "data": metrics.latest_inference
         })
         
-        return {
+        # Returned directly so FastAPI skips jsonable_encoder; orjson handles the numpy values
+        return ORJSONResponse({
             "success": True,
             "detections": detections,
-            "severity_score": round(severity_score, 2),
+            "severity_score": severity_score,
             "severity_level": severity_level,
             "crack_count": crack_count,
-            "avg_confidence": round(avg_confidence, 4),
-            "inference_time_ms": round(inference_time, 2),
+            "avg_confidence": avg_confidence,
+            "inference_time_ms": inference_time,
             "scans_remaining": (current_user.scans_limit - current_user.scans_used) if current_user else 999,
             "image_dimensions": {"width": width, "height": height},
             "gps": {"lat": gps_lat, "lon": gps_lon}
-        }
+        })
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
-    finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
 
 # =============================================================================
 # YOLO APP ENDPOINTS (Video / Camera / Analyze)
@@ -770,16 +1094,20 @@ async def analyze_image(file: UploadFile = File(...)):
     
     temp_path = None
     try:
-        contents = await file.read()
-        temp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}_{file.filename}")
-        with open(temp_path, "wb") as f:
-            f.write(contents)
-        
-        _backend_dir = Path(__file__).resolve().parent
-        model_path = str(_backend_dir / "best.pt") if os.path.exists(_backend_dir / "best.pt") else settings.MODEL_PATH
+        contents = await _read_upload(file, settings.MAX_FILE_SIZE)
+        # Name by uuid only: the client filename could collide or carry path components
+        ext = os.path.splitext(file.filename or "")[1].lower() or ".jpg"
+        temp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}{ext}")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(cpu_pool, _write_bytes, temp_path, contents)
         
-        result = get_pothole_data(temp_path, model_path=model_path)
+        # Reuse the server's model rather than loading a second copy into VRAM
+        result = await loop.run_in_executor(
+            cpu_pool, functools.partial(_analyze_image, temp_path, ensure_model_loaded())
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analyze error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -790,6 +1118,11 @@ async def analyze_image(file: UploadFile = File(...)):
             except:
                 pass
 
+def _analyze_image(path: str, shared_model):
+    """get_pothole_data on the shared model, serialized with the /predict batcher."""
+    with _model_lock:
+        return get_pothole_data(path, model=shared_model)
+
 @app.post("/analyze_video")
 async def analyze_video(file: UploadFile = File(...)):
     """Upload a video for MJPEG streaming analysis."""
@@ -799,15 +1132,14 @@ async def analyze_video(file: UploadFile = File(...)):
     ext = os.path.splitext(file.filename or "video.mp4")[1] or ".mp4"
     save_path = os.path.join(_upload_dir, f"{video_id}{ext}")
     
-    contents = await file.read()
-    with open(save_path, "wb") as f:
-        f.write(contents)
+    # Copy the spooled upload straight to disk without holding the video in memory
+    await asyncio.get_running_loop().run_in_executor(cpu_pool, _copy_upload, file.file, save_path)
     
     logger.info(f"Video uploaded: {save_path}")
     return {"video_id": video_id, "path": save_path}
 
 @app.get("/video_feed/{video_id}")
-async def video_feed(video_id: str, path: str = Query(...)):
+async def video_feed(video_id: str, path: str = Query(...), fps: Optional[float] = Query(None, gt=0)):
     """Stream MJPEG video feed with real-time YOLO detections."""
     global video_processor
     
@@ -823,7 +1155,8 @@ async def video_feed(video_id: str, path: str = Query(...)):
         raise HTTPException(status_code=404, detail="Video file not found")
     
     return StreamingResponse(
-        video_processor.process_video(path, is_live=False),
+        # ?fps= paces playback for viewers; without it frames stream as fast as they are processed
+        video_processor.process_video(path, is_live=False, target_fps=fps),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
@@ -863,14 +1196,15 @@ async def video_stats():
 async def admin_stats(admin: User = Depends(require_admin), db: Session = Depends(get_db)):
     """Get admin dashboard statistics."""
     total_users = db.query(User).count()
-    total_scans = db.query(Scan).count()
     
-    # Today's scans
+    # Today's scans (bounded range scan on the created_at index)
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     today_scans = db.query(Scan).filter(Scan.created_at >= today).count()
     
-    # Severity distribution
-    severity_dist = db.query(Scan.severity_level, db.func.count(Scan.id)).group_by(Scan.severity_level).all()
+    # Counted in the DB so every worker process reports the same totals;
+    # the group-by reads the severity_level index
+    total_scans = db.query(Scan).count()
+    severity_dist = db.query(Scan.severity_level, func.count(Scan.id)).group_by(Scan.severity_level).all()
     
     return {
         "total_users": total_users,
@@ -880,11 +1214,10 @@ async def admin_stats(admin: User = Depends(require_admin), db: Session = Depend
         "system_metrics": metrics.to_dict()
     }
 
-@app.get("/admin/users")
-async def admin_users(admin: User = Depends(require_admin), db: Session = Depends(get_db)):
-    """Get all users for admin."""
-    users = db.query(User).all()
-    return [{
+ADMIN_PAGE_MAX = 1000
+
+def _user_row(u: User) -> Dict[str, Any]:
+    return {
         "id": u.id,
         "email": u.email,
         "full_name": u.full_name,
@@ -892,17 +1225,10 @@ async def admin_users(admin: User = Depends(require_admin), db: Session = Depend
         "subscription_tier": u.subscription_tier,
         "scans_used": u.scans_used,
         "created_at": u.created_at.isoformat() if u.created_at else None
-    } for u in users]
+    }
 
-@app.get("/admin/scans")
-async def admin_scans(
-    limit: int = 100,
-    admin: User = Depends(require_admin),
-    db: Session = Depends(get_db)
-):
-    """Get recent scans for admin."""
-    scans = db.query(Scan).order_by(Scan.created_at.desc()).limit(limit).all()
-    return [{
+def _scan_row(s: Scan) -> Dict[str, Any]:
+    return {
         "id": s.id,
         "user_id": s.user_id,
         "severity_score": s.severity_score,
@@ -910,7 +1236,57 @@ async def admin_scans(
         "crack_count": s.crack_count,
         "inference_time_ms": s.inference_time_ms,
         "created_at": s.created_at.isoformat() if s.created_at else None
-    } for s in scans]
+    }
+
+def _stream_rows(build_query, to_row) -> StreamingResponse:
+    """Stream a JSON array row by row from a fresh session (runs in the threadpool)."""
+    dumps = orjson.dumps if orjson is not None else (lambda obj: json.dumps(obj).encode("utf-8"))
+    
+    def gen():
+        db = SessionLocal()
+        try:
+            yield b"["
+            for i, row in enumerate(build_query(db).yield_per(500)):
+                yield (b"," if i else b"") + dumps(to_row(row))
+            yield b"]"
+        finally:
+            db.close()
+    
+    return StreamingResponse(gen(), media_type="application/json")
+
+@app.get("/admin/users")
+async def admin_users(
+    cursor: Optional[int] = None,
+    limit: int = 100,
+    admin: User = Depends(require_admin)
+):
+    """Get users for admin, oldest first; pass the last id seen as ?cursor= for the next page."""
+    limit = max(1, min(limit, ADMIN_PAGE_MAX))
+    
+    def build_query(db: Session):
+        query = db.query(User)
+        if cursor is not None:
+            query = query.filter(User.id > cursor)
+        return query.order_by(User.id).limit(limit)
+    
+    return _stream_rows(build_query, _user_row)
+
+@app.get("/admin/scans")
+async def admin_scans(
+    cursor: Optional[int] = None,
+    limit: int = 100,
+    admin: User = Depends(require_admin)
+):
+    """Get recent scans for admin, newest first; pass the last id seen as ?cursor= for the next page."""
+    limit = max(1, min(limit, ADMIN_PAGE_MAX))
+    
+    def build_query(db: Session):
+        query = db.query(Scan)
+        if cursor is not None:
+            query = query.filter(Scan.id < cursor)
+        return query.order_by(Scan.id.desc()).limit(limit)
+    
+    return _stream_rows(build_query, _scan_row)
 
 # =============================================================================
 # MAIN ENTRY
@@ -922,5 +1298,9 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        # uvloop/httptools come with uvicorn[standard]; "auto" falls back on Windows
+        loop="auto",
+        http="auto",
+        workers=1 if settings.DEBUG else settings.WORKERS,  # reload is single-process only
         log_level="info"
     )
@@ -1,20 +1,142 @@
 import cv2
+import numpy as np
 from ultralytics import YOLO
 import time
 import os
+import uuid
+import queue
+import threading
+from collections import deque
+
+# SIMD libjpeg-turbo encoder (2-4x faster than cv2.imencode); optional
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+JPEG_QUALITY = 70
+
+def encode_jpeg(frame, quality=JPEG_QUALITY):
+    """Encode a BGR frame to JPEG bytes; returns None if encoding fails."""
+    if _tj is not None:
+        return _tj.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420)
+    # Baseline (non-optimized, non-progressive) encode is the cheapest libjpeg path
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                                               cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+                                               cv2.IMWRITE_JPEG_PROGRESSIVE, 0])
+    return buffer.tobytes() if ret else None
+
+# Snapshots are written by a daemon thread so slow disks never stall the stream
+_snap_q = queue.Queue(maxsize=32)
+
+def _snap_worker():
+    while True:
+        path, frame = _snap_q.get()
+        try:
+            cv2.imwrite(path, frame)
+        except Exception as e:
+            print(f"Snapshot write failed for {path}: {e}")
+
+threading.Thread(target=_snap_worker, daemon=True, name="snapshot-writer").start()
+
+def _mjpeg_chunk(data):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + data + b'\r\n'
 
 class VideoProcessor:
-    def __init__(self, model=None, model_path='best.pt', start_lat=40.7128, start_lon=-74.0060):
+    def __init__(self, model=None, model_path='best.pt', start_lat=40.7128, start_lon=-74.0060, batch_size=8,
+                 model_lock=None):
         # Accept an existing model instance to avoid loading twice
         self.model = model if model is not None else YOLO(model_path)
+        # Pass the owner's lock when the model is shared: Ultralytics stores per-call
+        # settings on the predictor, so calls from other threads must not interleave
+        self.model_lock = model_lock if model_lock is not None else threading.Lock()
         self.lat = start_lat
         self.lon = start_lon
         self.detection_count = 0
         self.latest_snapshot_path = None
         self.latest_snapshot_data = None
+        self.batch_size = batch_size
+
+    def _annotate(self, frame, r):
+        """Draw boxes for one result, auto-snapshot and advance the simulated GPS."""
+        if len(r.boxes) == 0:
+            # Empty frames are the common case: skip extraction, snapshot check and drawing
+            self.detection_count = 0
+            self.lat += 0.00001
+            self.lon += 0.00001
+            return
+        # Copy each tensor to host once; both the snapshot check and drawing reuse these
+        confs = r.boxes.conf.cpu().numpy()
+        xyxy = r.boxes.xyxy.cpu().numpy().astype(np.int32)
+        clss = r.boxes.cls.cpu().numpy().astype(np.int32)
+        self.detection_count = len(confs)
+        # Auto-snapshot logic: if any box > 0.7 confidence
+        should_snap = bool((confs > 0.7).any())
+
+        if should_snap:
+            snap_name = f"snap_{uuid.uuid4().hex}.jpg"
+            snap_path = os.path.join("snapshots", snap_name)
+            try:
+                # Copy now: the frame is annotated in place right after this
+                _snap_q.put_nowait((snap_path, frame.copy()))
+            except queue.Full:
+                # Writer is behind; drop this snapshot rather than block the stream
+                pass
+            else:
+                self.latest_snapshot_path = snap_path
+                # Store prediction data for this snap
+                self.latest_snapshot_data = {
+                    "image": snap_name,
+                    "detections": len(confs),
+                    "lat": self.lat,
+                    "lon": self.lon
+                }
+                print(f"[DEBUG] Auto-snapshot queued: {snap_path}")
 
-    def process_video(self, source, is_live=False):
-        # source can be path or camera index
+        for (x1, y1, x2, y2), conf, cls in zip(xyxy.tolist(), confs.tolist(), clss.tolist()):
+            label = f"{r.names[cls]} {conf:.2f}"
+
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        # Simulate GPS movement
+        self.lat += 0.00001
+        self.lon += 0.00001
+
+    def _run_batch(self, pending):
+        """Run one batched predict over buffered frames; returns their JPEG bytes in order."""
+        frames = [frame for frame, _ in pending]
+        with self.model_lock:
+            results = self.model.predict(frames, conf=0.35, verbose=False, imgsz=640, max_det=50)
+        encoded = []
+        for frame, r in zip(frames, results):
+            self._annotate(frame, r)
+            encoded.append(encode_jpeg(frame))
+        return encoded
+
+    def process_video(self, source, is_live=False, target_fps=None):
+        # source can be path or camera index; target_fps paces file playback (None = as fast as possible)
+        chunks = self._mjpeg_chunks(source, is_live)
+        interval = 1.0 / target_fps if target_fps and not is_live else None
+        if not interval:
+            yield from chunks
+            return
+        # Pace each emitted chunk: batches come out of flush() in bursts, so pacing reads wouldn't help
+        next_deadline = time.perf_counter()
+        for chunk in chunks:
+            yield chunk
+            # Deadline pacing: sleep only for what's left of this frame's slot
+            next_deadline += interval
+            delay = next_deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_deadline = time.perf_counter()  # fell behind; don't burst to catch up
+
+    def _mjpeg_chunks(self, source, is_live):
+        # One MJPEG chunk per source frame, in order
         cap = cv2.VideoCapture(source)
         if not cap.isOpened():
             print(f"Error: Could not open source {source}")
@@ -26,10 +148,22 @@ class VideoProcessor:
 
         # Skip more frames in live mode for better latency
         skip = 10 if is_live else 5
-        # JPEG encode params — lower quality for streaming = faster + less bandwidth
-        encode_params = [cv2.IMWRITE_JPEG_QUALITY, 75]
+        # Live feeds infer one frame at a time to keep latency low; files batch for throughput
+        batch_size = 1 if is_live else self.batch_size
+        pending = deque()  # [frame, repeat] pairs waiting for inference
         last_encoded = None  # cache for skipped frames
 
+        def flush():
+            nonlocal last_encoded
+            chunks = []
+            for (_, repeat), data in zip(pending, self._run_batch(pending)):
+                last_encoded = data or last_encoded
+                if last_encoded:
+                    # Re-emit once per source frame so playback cadence matches the input
+                    chunks.extend([_mjpeg_chunk(last_encoded)] * repeat)
+            pending.clear()
+            return chunks
+
         frame_count = 0
         while cap.isOpened():
             success, frame = cap.read()
@@ -38,59 +172,26 @@ class VideoProcessor:
 
             # Process every Nth frame for performance
             if frame_count % skip == 0:
-                results = self.model.predict(frame, conf=0.35, verbose=False, imgsz=640, max_det=50)
-                
-                # Annotate frame
-                for r in results:
-                    self.detection_count = len(r.boxes)
-                    # Auto-snapshot logic: if any box > 0.7 confidence
-                    should_snap = any(float(box.conf[0]) > 0.7 for box in r.boxes)
-                    
-                    if should_snap:
-                        snap_name = f"snap_{int(time.time())}.jpg"
-                        snap_path = os.path.join("snapshots", snap_name)
-                        cv2.imwrite(snap_path, frame)
-                        self.latest_snapshot_path = snap_path
-                        # Store prediction data for this snap
-                        self.latest_snapshot_data = {
-                            "image": snap_name,
-                            "detections": len(r.boxes),
-                            "lat": self.lat,
-                            "lon": self.lon
-                        }
-                        print(f"[DEBUG] Auto-snapshot saved: {snap_path}")
-
-                    for box in r.boxes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        conf = float(box.conf[0])
-                        cls = int(box.cls[0])
-                        label = f"{r.names[cls]} {conf:.2f}"
-                        
-                        # Draw bounding box
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                # Simulate GPS movement
-                self.lat += 0.00001
-                self.lon += 0.00001
-
-                # Encode processed frame and cache it
-                ret, buffer = cv2.imencode('.jpg', frame, encode_params)
-                last_encoded = buffer.tobytes() if ret else last_encoded
+                if len(pending) >= batch_size:
+                    yield from flush()
+                pending.append([frame, 1])
+                if batch_size == 1:
+                    yield from flush()
+            elif pending:
+                # Skipped frame while a batch is filling — repeat the sampled frame later
+                pending[-1][1] += 1
             else:
                 # Skipped frame — reuse last encoded frame (avoid re-encoding)
                 if last_encoded is None:
-                    ret, buffer = cv2.imencode('.jpg', frame, encode_params)
-                    last_encoded = buffer.tobytes() if ret else b''
-
-            if last_encoded:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + last_encoded + b'\r\n')
+                    last_encoded = encode_jpeg(frame) or b''
+                if last_encoded:
+                    yield _mjpeg_chunk(last_encoded)
 
             frame_count += 1
-            if not is_live:
-                 # Small sleep for file processing to not finish instantly
-                 time.sleep(0.01)
+
+        # Flush the final partial batch
+        if pending:
+            yield from flush()
 
         cap.release()
 
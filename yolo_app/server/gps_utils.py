@@ -1,5 +1,6 @@
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+import mmap
+from contextlib import contextmanager
+from PIL import Image, ExifTags
 
 def get_decimal_from_dms(dms, ref):
     """
@@ -14,31 +15,36 @@ def get_decimal_from_dms(dms, ref):
         decimal = -decimal
     return decimal
 
+@contextmanager
+def open_mmap(image_path):
+    """
+    Open an image backed by a read-only memory map of the file.
+    Only the pages Pillow actually touches are read from the page cache.
+    """
+    with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with Image.open(mm) as image:
+            yield image
+
+def read_gps_ifd(image_path):
+    """
+    Return the GPS IFD; only the header pages holding EXIF are faulted in.
+    """
+    with open_mmap(image_path) as image:
+        return image.getexif().get_ifd(ExifTags.IFD.GPSInfo)
+
 def get_gps_coordinates(image_path):
     """
     Extract GPS longitude and latitude from image EXIF data.
     Returns: (lat, lon) or (None, None) if not found.
     """
     try:
-        image = Image.open(image_path)
-        exif_data = image._getexif()
-        
-        if not exif_data:
-            return None, None
-        
-        gps_info = {}
-        for tag, value in exif_data.items():
-            decoded = TAGS.get(tag, tag)
-            if decoded == "GPSInfo":
-                for t in value:
-                    sub_decoded = GPSTAGS.get(t, t)
-                    gps_info[sub_decoded] = value[t]
+        gps_info = read_gps_ifd(image_path)
         
         if not gps_info:
             return None, None
         
-        lat = get_decimal_from_dms(gps_info.get('GPSLatitude'), gps_info.get('GPSLatitudeRef'))
-        lon = get_decimal_from_dms(gps_info.get('GPSLongitude'), gps_info.get('GPSLongitudeRef'))
+        lat = get_decimal_from_dms(gps_info.get(ExifTags.GPS.GPSLatitude), gps_info.get(ExifTags.GPS.GPSLatitudeRef))
+        lon = get_decimal_from_dms(gps_info.get(ExifTags.GPS.GPSLongitude), gps_info.get(ExifTags.GPS.GPSLongitudeRef))
         
         return lat, lon
     except Exception as e:
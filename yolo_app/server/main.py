@@ -2,20 +2,25 @@ import os
 import hashlib
 import shutil
 import uuid
+import threading
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import json
 from pathlib import Path
+from typing import Optional
+import numpy as np
 
 # Import custom utilities
 from hackathon.Source_Code.submission import get_pothole_data
-from video_processor import VideoProcessor
+from video_processor import VideoProcessor, load_model, PREDICT_DEVICE
 from database import SessionLocal, User, init_db, get_db
 
 # Security Configuration
@@ -23,9 +28,16 @@ SECRET_KEY = "SUPER_SECRET_NEURAL_KEY_2026"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 1 day
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2id for new hashes; bcrypt kept only so legacy hashes can still verify and migrate
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+)
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Initialize Database
 from database import DATABASE_URL
@@ -39,14 +51,18 @@ app.mount("/snaps", StaticFiles(directory="snapshots"), name="snaps")
 
 # Helper functions
 def get_password_hash(password: str):
-    # Pre-hash with SHA-256 to overcome bcrypt's 72-byte limit
-    pre_hash = hashlib.sha256(password.encode()).hexdigest()
-    return pwd_context.hash(pre_hash)
+    # argon2 has no 72-byte input limit, so no pre-hash is needed
+    return pwd_context.hash(password)
 
 def verify_session_password(plain_password, hashed_password):
-    # Pre-hash with SHA-256 to match the stored hash
-    pre_hash = hashlib.sha256(plain_password.encode()).hexdigest()
-    return pwd_context.verify(pre_hash, hashed_password)
+    # Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded
+    if pwd_context.identify(hashed_password) == "bcrypt":
+        # Legacy hashes are bcrypt over a SHA-256 pre-hash of the password
+        pre_hash = hashlib.sha256(plain_password.encode()).hexdigest()
+        if not pwd_context.verify(pre_hash, hashed_password):
+            return False, None
+        return True, get_password_hash(plain_password)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -54,14 +70,20 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Auth request bodies (validated by pydantic, malformed input gets a 422)
+class CredentialsIn(BaseModel):
+    # Login matches stored emails exactly, so existing accounts aren't re-validated or normalized
+    email: str
+    password: str
+
+class RegisterIn(CredentialsIn):
+    email: EmailStr
+
 # Auth Endpoints
 @app.post("/register")
-async def register(data: dict, db: Session = Depends(get_db)):
-    email = data.get("email")
-    password = data.get("password")
-    
-    if not email or not password:
-        raise HTTPException(status_code=400, detail="Email and password required")
+async def register(body: RegisterIn, db: Session = Depends(get_db)):
+    email = body.email
+    password = body.password
         
     db_user = db.query(User).filter(User.email == email).first()
     if db_user:
@@ -75,13 +97,19 @@ async def register(data: dict, db: Session = Depends(get_db)):
     return {"status": "success", "message": "Identity established in Neural Network"}
 
 @app.post("/login")
-async def login(data: dict, db: Session = Depends(get_db)):
-    email = data.get("email")
-    password = data.get("password")
+async def login(body: CredentialsIn, db: Session = Depends(get_db)):
+    email = body.email
+    password = body.password
     
     user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_session_password(password, user.hashed_password):
+    valid, new_hash = verify_session_password(password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid access credentials")
+    
+    # Migrate legacy SHA-256+bcrypt hashes to argon2 on successful login
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
         
     access_token = create_access_token(data={"sub": user.email})
     return {"status": "success", "access_token": access_token, "token_type": "bearer"}
@@ -105,8 +133,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load the model once and share it between /analyze and the video feeds
+MODEL_PATH = "hackathon/Source_Code/best.pt"
+if not os.path.exists(MODEL_PATH):
+    MODEL_PATH = "best.pt" if os.path.exists("best.pt") else "yolov8n.pt"
+print(f"[INIT] Loading model: {MODEL_PATH}")
+# TensorRT FP16 engine on CUDA machines; set YOLO_BACKEND=pt to force the PyTorch weights
+shared_model = load_model(MODEL_PATH)
+# Warm-up pass so the first real request doesn't pay the lazy init cost; Ultralytics fixes
+# device and FP16 when it builds the predictor on this first call, so pass them here
+shared_model(np.zeros((640, 640, 3), np.uint8), verbose=False, **PREDICT_DEVICE)
+
+# Ultralytics stores per-call settings on the shared predictor, so /analyze and the
+# video inference threads take turns on the model
+model_lock = threading.Lock()
+
 # Global VideoProcessor instance
-video_processor = VideoProcessor(model_path="hackathon/Source_Code/best.pt" if os.path.exists("hackathon/Source_Code/best.pt") else "best.pt")
+video_processor = VideoProcessor(model=shared_model, model_lock=model_lock)
+
+def _analyze_file(file_path):
+    with model_lock:
+        return get_pothole_data(file_path, model=shared_model)
 
 @app.post("/analyze")
 async def analyze_image(file: UploadFile = File(...)):
@@ -123,13 +170,8 @@ async def analyze_image(file: UploadFile = File(...)):
         
         print(f"[DEBUG] File saved to: {file_path}")
         
-        # 1. Run consolidated detection and GPS extraction
-        model_path = "hackathon/Source_Code/best.pt"
-        if not os.path.exists(model_path):
-            model_path = "best.pt" if os.path.exists("best.pt") else "yolov8n.pt"
-            
-        print(f"[DEBUG] Using model: {model_path}")
-        result_data = get_pothole_data(file_path, model_path=model_path)
+        # 1. Run consolidated detection and GPS extraction (off the event loop)
+        result_data = await run_in_threadpool(_analyze_file, file_path)
         
         # Fallback GPS if null
         final_lat = result_data["lat"]
@@ -177,10 +219,24 @@ async def analyze_video(file: UploadFile = File(...)):
     return {"status": "success", "video_id": request_id, "video_path": str(video_path)}
 
 @app.get("/video_feed/{video_id}")
-async def video_feed(video_id: str, path: str):
+async def video_feed(video_id: str, path: str, record: bool = False, fps: Optional[float] = None):
     # This route will stream the frames from the video_processor
-    return StreamingResponse(video_processor.process_video(path, is_live=False),
-                             media_type="multipart/x-mixed-replace; boundary=frame")
+    # With ?record=true the annotated video is also saved as H.264 next to the upload
+    record_path = None
+    if record:
+        # Only record uploads from /analyze_video, never next to arbitrary files on the server
+        try:
+            upload_dir = Path(f"temp_video_{uuid.UUID(video_id)}").resolve()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid video id")
+        if Path(path).resolve().parent != upload_dir:
+            raise HTTPException(status_code=400, detail="Recording is only available for uploaded videos")
+        record_path = os.path.splitext(path)[0] + "_annotated.mp4"
+    headers = {"X-Annotated-Video": record_path} if record_path else None
+    # ?fps= paces playback for viewers; without it frames stream as fast as they are processed
+    return StreamingResponse(video_processor.process_video(path, is_live=False, record_path=record_path,
+                                                           target_fps=fps),
+                             media_type="multipart/x-mixed-replace; boundary=frame", headers=headers)
 
 @app.get("/camera_feed")
 async def camera_feed(index: int = 0):
@@ -194,4 +250,7 @@ async def get_video_stats():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop/httptools are used automatically when installed (uvicorn[standard]).
+    # Workers stay opt-in: each one loads its own model and video stats.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="auto", http="auto",
+                workers=int(os.getenv("WORKERS", "1")))
@@ -1,83 +1,566 @@
 import cv2
+import numpy as np
 from ultralytics import YOLO
 import time
 import os
+import re
+import shutil
+import uuid
+import queue
+import threading
+
+try:
+    import torch
+    _cuda = torch.cuda.is_available()
+except Exception:
+    _cuda = False
+
+# FP16 inference on CUDA halves memory traffic; CPU stays FP32
+PREDICT_DEVICE = {"half": True, "device": 0} if _cuda else {}
+
+# nvJPEG encoding through torchvision when a CUDA GPU is present; optional
+try:
+    from torchvision.io import encode_jpeg as _tv_encode_jpeg
+    _gpu_jpeg = _cuda
+except Exception:
+    _gpu_jpeg = False
+
+# libjpeg-turbo SIMD encoder, used when there is no GPU encoder; optional
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+JPEG_QUALITY = 85
+SNAPSHOT_QUALITY = 85
+LABEL_PAD = 2  # margin around cached label masks for the thickness-2 strokes
+LABEL_COLOR = (0, 255, 0)
+
+def encode_jpeg(frame, quality=JPEG_QUALITY):
+    global _gpu_jpeg
+    if _gpu_jpeg:
+        try:
+            # Upload once, BGR->RGB and HWC->CHW on the GPU, encode with nvJPEG
+            tensor = torch.from_numpy(frame).cuda().flip(-1).permute(2, 0, 1).contiguous()
+            return _tv_encode_jpeg(tensor, quality=quality).cpu().numpy().tobytes()
+        except Exception as e:
+            # torchvision < 0.19 can't encode CUDA tensors; use the CPU path from now on
+            print(f"[DEBUG] GPU JPEG encoding unavailable, falling back to CPU: {e}")
+            _gpu_jpeg = False
+    if _tj is not None:
+        return _tj.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ret else b''
+
+# Adaptive frame skipping: compare 64x64 grayscale thumbnails instead of a fixed "every 5th"
+DIFF_SIZE = (64, 64)
+MIN_DIFF = 6.0        # mean abs pixel change (0-255) that always triggers a detection
+DIFF_FACTOR = 3.0     # ...plus this many times the usual frame-to-frame change
+DIFF_EMA_ALPHA = 0.1
+MAX_SKIP = 15         # force a detection at least this often so new objects are caught
+
+# Box tracking between detections
+TRACK_IOU = 0.3       # minimum IoU to match a detection to an existing track
+TRACK_MAX_MISSED = 1  # detections a track may miss (hidden) before it is dropped
+
+# Constant-velocity model over (cx, cy, w, h, vx, vy); one step per video frame
+_KF_TRANSITION = np.array([[1, 0, 0, 0, 1, 0],
+                           [0, 1, 0, 0, 0, 1],
+                           [0, 0, 1, 0, 0, 0],
+                           [0, 0, 0, 1, 0, 0],
+                           [0, 0, 0, 0, 1, 0],
+                           [0, 0, 0, 0, 0, 1]], np.float32)
+_KF_MEASUREMENT = np.eye(4, 6, dtype=np.float32)
+_KF_PROCESS_NOISE = np.diag([1, 1, 1, 1, 0.5, 0.5]).astype(np.float32)
+_KF_MEASUREMENT_NOISE = np.eye(4, dtype=np.float32) * 4
+
+def _to_cxcywh(x1, y1, x2, y2):
+    return np.array([[(x1 + x2) / 2], [(y1 + y2) / 2], [x2 - x1], [y2 - y1]], np.float32)
+
+def _iou_matrix(a, b):
+    # a: (N, 4), b: (M, 4) xyxy arrays -> (N, M) IoU
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+class _Track:
+    def __init__(self, box):
+        x1, y1, x2, y2, self.label = box
+        self.kf = cv2.KalmanFilter(6, 4)
+        self.kf.transitionMatrix = _KF_TRANSITION.copy()
+        self.kf.measurementMatrix = _KF_MEASUREMENT.copy()
+        self.kf.processNoiseCov = _KF_PROCESS_NOISE.copy()
+        self.kf.measurementNoiseCov = _KF_MEASUREMENT_NOISE.copy()
+        self.kf.errorCovPost = np.eye(6, dtype=np.float32) * 10
+        self.kf.statePost = np.vstack([_to_cxcywh(x1, y1, x2, y2), np.zeros((2, 1), np.float32)])
+        self.missed = 0
+        self.box = (x1, y1, x2, y2)
+
+    def predict(self):
+        cx, cy, w, h = self.kf.predict()[:4, 0]
+        self.box = (int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2))
+        return self.box
+
+    def correct(self, box):
+        x1, y1, x2, y2, self.label = box
+        self.kf.correct(_to_cxcywh(x1, y1, x2, y2))
+        self.box = (x1, y1, x2, y2)
+        self.missed = 0
+
+class BoxTracker:
+    """Kalman-filter tracks that carry detections across the frames YOLO skips."""
+    def __init__(self):
+        self.tracks = []
+
+    def update(self, boxes):
+        # Called on detection frames with (x1, y1, x2, y2, label) boxes
+        predicted = np.array([t.predict() for t in self.tracks], np.float32).reshape(-1, 4)
+        detected = np.array([b[:4] for b in boxes], np.float32).reshape(-1, 4)
+        unmatched = set(range(len(boxes)))
+        matched_tracks = set()
+        if len(predicted) and len(detected):
+            iou = _iou_matrix(predicted, detected)
+            # Greedy matching, best overlaps first
+            for ti, di in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[ti, di] < TRACK_IOU:
+                    break
+                if ti in matched_tracks or di not in unmatched:
+                    continue
+                self.tracks[ti].correct(boxes[di])
+                matched_tracks.add(ti)
+                unmatched.discard(di)
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= TRACK_MAX_MISSED]
+        self.tracks.extend(_Track(boxes[di]) for di in sorted(unmatched))
+
+    def predict(self):
+        # Called on skipped frames; returns predicted boxes for tracks seen in the last detection
+        return [(*t.predict(), t.label) for t in self.tracks if t.missed == 0]
+
+INFER_SIZE = 640  # model input size; frames are shrunk to this before predict
+
+def _downscale(frame, size=INFER_SIZE):
+    # Shrink the long side to size on the CPU once; returns (image, factor back to frame coords)
+    height, width = frame.shape[:2]
+    scale = max(height, width) / size
+    if scale <= 1:
+        return frame, 1.0
+    return cv2.resize(frame, (round(width / scale), round(height / scale)), interpolation=cv2.INTER_LINEAR), scale
+
+MAX_BATCH = 8  # largest video batch size; TensorRT engines are built for it
+MAX_BUFFERED = 32  # frames held while a batch fills; flushed early past this to bound memory
+
+def _engine_cache_path(model_path):
+    # Engines only run on the GPU/TensorRT they were built for, so key the cache on both
+    import tensorrt as trt
+    gpu_name = re.sub(r"[^A-Za-z0-9]+", "-", torch.cuda.get_device_name(0)).strip("-")
+    return f"{os.path.splitext(model_path)[0]}.{gpu_name}.{trt.__version__}.engine"
+
+def load_model(model_path, backend=None):
+    # backend: "pt", "engine" (TensorRT FP16) or "auto" (engine when CUDA is available)
+    backend = backend or os.getenv("YOLO_BACKEND", "auto")
+    if backend == "auto":
+        backend = "engine" if _cuda else "pt"
+    if backend != "engine" or not model_path.endswith(".pt"):
+        return YOLO(model_path)
+
+    try:
+        engine_path = _engine_cache_path(model_path)
+        if not os.path.exists(engine_path):
+            print(f"[INIT] Exporting TensorRT engine from {model_path} (one-time)")
+            # Dynamic shapes so any batch up to MAX_BATCH runs on the same engine
+            exported = YOLO(model_path).export(format="engine", half=True, dynamic=True,
+                                               batch=MAX_BATCH, imgsz=640)
+            shutil.move(str(exported), engine_path)
+        model = YOLO(engine_path, task="detect")
+        # Engines deserialize on the first call; a stale or foreign one fails here, not at startup
+        model(np.zeros((640, 640, 3), np.uint8), verbose=False, **PREDICT_DEVICE)
+        return model
+    except Exception as e:
+        print(f"[INIT] TensorRT engine unavailable, using PyTorch weights: {e}")
+        return YOLO(model_path)
+
+class _CudaCapture:
+    # cv2.VideoCapture look-alike that decodes on the GPU (NVDEC) via cv2.cudacodec
+    def __init__(self, source):
+        self.reader = cv2.cudacodec.createVideoReader(source)
+        try:
+            self.reader.set(cv2.cudacodec.ColorFormat_BGR)  # OpenCV >= 4.8; older builds give BGRA
+        except Exception:
+            pass
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        # Only the frame rate is needed (for recording); FormatInfo.fps is 0 when the stream lacks it
+        if prop == cv2.CAP_PROP_FPS:
+            try:
+                return float(self.reader.format().fps)
+            except Exception:
+                return 0.0
+        return 0.0
+
+    def read(self):
+        ok, gpu_frame = self.reader.nextFrame()
+        if not ok:
+            return False, None
+        if gpu_frame.channels() == 4:
+            gpu_frame = cv2.cuda.cvtColor(gpu_frame, cv2.COLOR_BGRA2BGR)
+        # Drawing, thumbnails and encoding run on the host, so download once here
+        return True, gpu_frame.download()
+
+    def release(self):
+        self.opened = False
+        self.reader = None
+
+def _open_capture(source):
+    # Files and stream URLs decode on NVDEC when OpenCV was built with CUDA; cameras use VideoCapture
+    if isinstance(source, str) and hasattr(cv2, "cudacodec"):
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                return _CudaCapture(source)
+        except Exception as e:
+            print(f"[DEBUG] CUDA video decode unavailable, using VideoCapture: {e}")
+    return cv2.VideoCapture(source)
+
+class _CudaWriter:
+    # cv2.VideoWriter look-alike that encodes H.264 on the GPU (NVENC) via cv2.cudacodec
+    def __init__(self, path, fps, size):
+        self.writer = cv2.cudacodec.createVideoWriter(path, size, cv2.cudacodec.H264, fps,
+                                                      cv2.cudacodec.ColorFormat_BGR)
+        self.gpu_frame = cv2.cuda_GpuMat()
+
+    def write(self, frame):
+        self.gpu_frame.upload(frame)
+        self.writer.write(self.gpu_frame)
+
+    def release(self):
+        self.writer.release()
+
+def _open_writer(path, fps, size):
+    # NVENC H.264 when OpenCV was built with CUDA; otherwise OpenCV's CPU mp4v writer
+    if hasattr(cv2, "cudacodec"):
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                return _CudaWriter(path, fps, size)
+        except Exception as e:
+            print(f"[DEBUG] CUDA video encode unavailable, using VideoWriter: {e}")
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+# Bounded hand-off queues between the capture, inference and encode stages
+PIPELINE_DEPTH = 4
+
+def _put(q, item, stop):
+    # Blocking put that gives up once the stream is stopped
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+def _drain(q, stop):
+    # Yield items until the None sentinel, or until the stream is stopped
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is None:
+            return
+        yield item
+
+# Snapshot writes happen off the inference thread; the queue is bounded because each
+# pending write holds a full-resolution frame
+_snap_q = queue.Queue(maxsize=32)
+
+def _snap_worker():
+    while True:
+        path, frame = _snap_q.get()
+        try:
+            cv2.imwrite(path, frame, [cv2.IMWRITE_JPEG_QUALITY, SNAPSHOT_QUALITY])
+        except Exception as e:
+            print(f"[DEBUG] Snapshot write failed for {path}: {e}")
+
+for _ in range(2):
+    threading.Thread(target=_snap_worker, daemon=True, name="snapshot-writer").start()
 
 class VideoProcessor:
-    def __init__(self, model_path='best.pt', start_lat=40.7128, start_lon=-74.0060):
-        self.model = YOLO(model_path)
+    def __init__(self, model=None, model_path='best.pt', start_lat=40.7128, start_lon=-74.0060, batch_size=None,
+                 model_lock=None):
+        # Accept an existing model instance to avoid loading twice
+        self.model = model if model is not None else load_model(model_path)
+        # Pass the owner's lock when the model is shared: Ultralytics stores per-call
+        # settings on the predictor, so calls from other threads must not interleave
+        self.model_lock = model_lock if model_lock is not None else threading.Lock()
         self.lat = start_lat
         self.lon = start_lon
         self.detection_count = 0
+        # Frames per predict call for file sources; None = calibrate on the first video
+        self.batch_size = batch_size
+        self._label_cache = {}  # label text -> (tile, mask, baseline offset)
+
+    def _pick_batch_size(self, frame, candidates=(1, 2, 4, MAX_BATCH)):
+        # Time each batch size once and keep the one with the best frames/sec
+        best, best_fps = 1, 0.0
+        small, _ = _downscale(frame)
+        for size in candidates:
+            batch = [small] * size
+            with self.model_lock:
+                self.model.predict(batch, conf=0.25, verbose=False, imgsz=INFER_SIZE, **PREDICT_DEVICE)  # warm-up for this shape
+                start = time.perf_counter()
+                self.model.predict(batch, conf=0.25, verbose=False, imgsz=INFER_SIZE, **PREDICT_DEVICE)
+                fps = size / (time.perf_counter() - start)
+            # Larger batches must beat the current best by 10% to be worth the added latency
+            if fps > best_fps * 1.1:
+                best, best_fps = size, fps
+        print(f"[DEBUG] Video batch size calibrated to {best} ({best_fps:.1f} fps)")
+        return best
+
+    def _annotate(self, frame, r, scale=1.0, canvas=None):
+        # Boxes are drawn on canvas (default frame); scale maps them from the inference image onto it.
+        # Snapshots always come from the full-resolution frame
+        if canvas is None:
+            canvas = frame
+        count = len(r.boxes)
+        self.detection_count = count
+        if count == 0:
+            # Most frames in sparse scenes: nothing to extract, snapshot or draw
+            self.lat += 0.00001
+            self.lon += 0.00001
+            return []
+        if count == 1:
+            # Single box: one host copy of its data row, plain Python scalars from there
+            x1, y1, x2, y2, conf, cls = r.boxes.data[0, :6].tolist()
+            xyxy = [[int(x1 * scale), int(y1 * scale), int(x2 * scale), int(y2 * scale)]]
+            confs, clss = [conf], [int(cls)]
+            should_snap = conf > 0.7
+        else:
+            # One device->host copy per tensor instead of a sync per box
+            xyxy = (r.boxes.xyxy.cpu().numpy() * scale).astype(np.int32).tolist()
+            confs = r.boxes.conf.cpu().numpy()
+            clss = r.boxes.cls.cpu().numpy().astype(np.int32).tolist()
+            # Auto-snapshot logic: if any box > 0.7 confidence
+            should_snap = bool((confs > 0.7).any())
+            confs = confs.tolist()
+
+        if should_snap:
+            snap_name = f"snap_{uuid.uuid4().hex}.jpg"
+            snap_path = os.path.join("snapshots", snap_name)
+            try:
+                # Copy only if boxes are about to be drawn onto frame itself
+                _snap_q.put_nowait((snap_path, frame.copy() if canvas is frame else frame))
+            except queue.Full:
+                # Writers are behind; drop this snapshot rather than block the stream
+                pass
+            else:
+                self.latest_snapshot_path = snap_path
+                # Store prediction data for this snap
+                self.latest_snapshot_data = {
+                    "image": snap_name,
+                    "detections": count,
+                    "lat": self.lat,
+                    "lon": self.lon
+                }
+                print(f"[DEBUG] Auto-snapshot queued: {snap_path}")
+
+        boxes = [(x1, y1, x2, y2, f"{r.names[cls]} {conf:.2f}")
+                 for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, clss)]
+        self._draw_boxes(canvas, boxes)
 
-    def process_video(self, source, is_live=False):
-        # source can be path or camera index
-        cap = cv2.VideoCapture(source)
+        # Simulate GPS movement
+        self.lat += 0.00001
+        self.lon += 0.00001
+        return boxes
+
+    def _label_tile(self, label):
+        # Rasterize each label once; labels carry 2-decimal confidences, so keys repeat quickly
+        cached = self._label_cache.get(label)
+        if cached is None:
+            (w, h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+            canvas = np.zeros((h + baseline + 2 * LABEL_PAD, w + 2 * LABEL_PAD), np.uint8)
+            cv2.putText(canvas, label, (LABEL_PAD, h + LABEL_PAD), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 255, 2)
+            # Glyph mask plus the offset from the putText origin (baseline-left) to the canvas top-left
+            mask = (canvas >= 128).astype(np.uint8)
+            tile = np.empty(mask.shape + (3,), np.uint8)
+            tile[:] = LABEL_COLOR
+            cached = self._label_cache[label] = (tile, mask, h + LABEL_PAD)
+        return cached
+
+    def _draw_boxes(self, frame, boxes):
+        frame_h, frame_w = frame.shape[:2]
+        for x1, y1, x2, y2, label in boxes:
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            # Stamp the cached label where cv2.putText(frame, label, (x1, y1 - 10), ...) would draw
+            tile, mask, top = self._label_tile(label)
+            tx, ty = x1 - LABEL_PAD, y1 - 10 - top
+            cx0, cy0 = max(tx, 0), max(ty, 0)
+            cx1, cy1 = min(tx + mask.shape[1], frame_w), min(ty + mask.shape[0], frame_h)
+            if cx0 < cx1 and cy0 < cy1:
+                sy, sx = slice(cy0 - ty, cy1 - ty), slice(cx0 - tx, cx1 - tx)
+                cv2.copyTo(tile[sy, sx], mask[sy, sx], frame[cy0:cy1, cx0:cx1])
+
+    def _encode(self, frame):
+        # Encode frame to JPEG
+        frame_bytes = encode_jpeg(frame)
+
+        return (b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+    def _annotated_frames(self, frames, is_live, full_res=False):
+        # Yields frames in their original order with boxes drawn. Unless full_res, boxes go onto
+        # the INFER_SIZE image already made for the model, which doubles as the stream preview
+        # Live feeds infer one frame at a time so the stream doesn't lag behind the camera
+        batch_size = 1 if is_live else self.batch_size
+        buffered = []  # (frame, small, scale, sampled) held back until their batch has been inferred
+        tracker = BoxTracker()  # propagates boxes onto skipped frames
+
+        def flush():
+            # One predict call for all sampled frames, then emit every buffered frame in order
+            # stream=True hands back each Results as it is post-processed instead of building a list;
+            # the predictor itself is set up once and reused by Ultralytics across calls
+            images = [small for _, small, _, is_sampled in buffered if is_sampled]
+            done = []
+            # The lock covers the whole stream, since results are produced lazily as it is read
+            with self.model_lock:
+                results = iter(self.model.predict(images, conf=0.25, verbose=False,
+                                                  imgsz=INFER_SIZE, stream=True, **PREDICT_DEVICE))
+                for frame, small, scale, is_sampled in buffered:
+                    canvas = frame if full_res else small
+                    if is_sampled:
+                        tracker.update(self._annotate(frame, next(results), scale if full_res else 1.0, canvas))
+                    else:
+                        self._draw_boxes(canvas, tracker.predict())
+                    done.append(canvas)
+                del results  # finish the predict generator before another thread can use the model
+            buffered.clear()
+            return done
+
+        ref_small = prev_small = None  # thumbnails of the last detected / previous frame
+        diff_ema = 0.0
+        since_detect = 0
+        pending = 0  # sampled frames in buffered
+        # Hot-loop locals: skip attribute and global lookups on every frame
+        resize, cvt_color, absdiff = cv2.resize, cv2.cvtColor, cv2.absdiff
+        draw_boxes, track_predict = self._draw_boxes, tracker.predict
+
+        for frame in frames:
+            # Detect only when the scene has changed enough since the last detection
+            small = cvt_color(resize(frame, DIFF_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            if ref_small is None:
+                detect = True
+            else:
+                diff_ema += DIFF_EMA_ALPHA * (float(absdiff(small, prev_small).mean()) - diff_ema)
+                diff = float(absdiff(small, ref_small).mean())
+                detect = since_detect >= MAX_SKIP or diff > MIN_DIFF + DIFF_FACTOR * diff_ema
+            prev_small = small
+
+            if detect:
+                ref_small = small
+                since_detect = 0
+                if batch_size is None:
+                    batch_size = self.batch_size = self._pick_batch_size(frame)
+                buffered.append((frame, *_downscale(frame), True))
+                pending += 1
+                if pending == batch_size:
+                    pending = 0
+                    yield from flush()
+            else:
+                since_detect += 1
+                canvas = frame if full_res else _downscale(frame)[0]
+                if buffered:
+                    # Preview mode only draws on canvas, so don't keep the full-res frame alive
+                    buffered.append((frame if full_res else None, canvas, 1.0, False))
+                    if len(buffered) >= MAX_BUFFERED:
+                        pending = 0
+                        yield from flush()
+                else:
+                    draw_boxes(canvas, track_predict())
+                    yield canvas
+
+        # Flush the final partial batch
+        if buffered:
+            yield from flush()
+
+    def process_video(self, source, is_live=False, record_path=None, target_fps=None):
+        # source can be path or camera index; record_path also saves the annotated video;
+        # target_fps paces file playback (None = as fast as the pipeline and client allow)
+        cap = _open_capture(source)
         if not cap.isOpened():
             print(f"Error: Could not open source {source}")
             return
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
 
         os.makedirs("snapshots", exist_ok=True)
         self.latest_snapshot_path = None
         self.latest_snapshot_data = None
 
-        frame_count = 0
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-
-            # Process every 5th frame for performance
-            if frame_count % 5 == 0:
-                results = self.model.predict(frame, conf=0.25, verbose=False)
-                
-                # Annotate frame
-                for r in results:
-                    self.detection_count = len(r.boxes)
-                    # Auto-snapshot logic: if any box > 0.7 confidence
-                    should_snap = any(float(box.conf[0]) > 0.7 for box in r.boxes)
-                    
-                    if should_snap:
-                        snap_name = f"snap_{int(time.time())}.jpg"
-                        snap_path = os.path.join("snapshots", snap_name)
-                        cv2.imwrite(snap_path, frame)
-                        self.latest_snapshot_path = snap_path
-                        # Store prediction data for this snap
-                        self.latest_snapshot_data = {
-                            "image": snap_name,
-                            "detections": len(r.boxes),
-                            "lat": self.lat,
-                            "lon": self.lon
-                        }
-                        print(f"[DEBUG] Auto-snapshot saved: {snap_path}")
-
-                    for box in r.boxes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        conf = float(box.conf[0])
-                        cls = int(box.cls[0])
-                        label = f"{r.names[cls]} {conf:.2f}"
-                        
-                        # Draw bounding box
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                # Simulate GPS movement
-                self.lat += 0.00001
-                self.lon += 0.00001
-
-            # Encode frame to JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-
-            frame_count += 1
-            if not is_live:
-                 # Small sleep for file processing to not finish instantly
-                 time.sleep(0.01)
-
-        cap.release()
+        # Capture -> inference -> encode/yield run as a pipeline so the GPU isn't idle
+        # during cap.read() or JPEG encoding
+        cap_q = queue.Queue(maxsize=PIPELINE_DEPTH)
+        out_q = queue.Queue(maxsize=PIPELINE_DEPTH)
+        stop = threading.Event()
+
+        def capture():
+            read = cap.read
+            try:
+                while not stop.is_set():
+                    success, frame = read()
+                    if not success:
+                        break
+                    _put(cap_q, frame, stop)
+            finally:
+                cap.release()
+                _put(cap_q, None, stop)
+
+        def infer():
+            writer = None
+            try:
+                # Recording keeps full resolution; the browser stream only needs the preview size
+                for frame in self._annotated_frames(_drain(cap_q, stop), is_live, full_res=bool(record_path)):
+                    if record_path:
+                        if writer is None:
+                            writer = _open_writer(record_path, fps, (frame.shape[1], frame.shape[0]))
+                        writer.write(frame)
+                        frame = _downscale(frame)[0]
+                    _put(out_q, frame, stop)
+            except Exception as e:
+                print(f"Error: Video inference failed: {e}")
+            finally:
+                if writer is not None:
+                    writer.release()
+                _put(out_q, None, stop)
+
+        threading.Thread(target=capture, daemon=True).start()
+        threading.Thread(target=infer, daemon=True).start()
+        interval = 1.0 / target_fps if target_fps and not is_live else None
+        next_deadline = time.perf_counter()
+        try:
+            for frame in _drain(out_q, stop):
+                yield self._encode(frame)
+
+                if interval:
+                    # Deadline pacing: sleep only for what's left of this frame's slot
+                    next_deadline += interval
+                    delay = next_deadline - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_deadline = time.perf_counter()  # fell behind; don't burst to catch up
+        finally:
+            # Also runs when the client disconnects, so both threads wind down
+            stop.set()
 
     def get_current_stats(self):
         return {